@@ -1,14 +1,28 @@
+import csv
+import hashlib
+import io
 import os
+import queue
+import re
 import sqlite3
-from datetime import datetime
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
 from functools import wraps
-from flask import Flask, render_template, request, redirect, url_for, session, send_file
-from werkzeug.security import generate_password_hash, check_password_hash
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table
+from argon2 import PasswordHasher
+from argon2.exceptions import VerifyMismatchError
+from flask import Flask, g, render_template, request, redirect, url_for, session, send_file
+from flask_caching import Cache
+from flask_compress import Compress
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.security import check_password_hash
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, PageBreak
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib import units
-import shutil
 
 # ===============================
 # CONFIGURATION FLASK
@@ -16,22 +30,132 @@ import shutil
 app = Flask(__name__)
 app.secret_key = os.environ.get("HOTELDESK_SECRET", "hoteldeskpro_secret_key_2026_x9!#")
 
+# Les templates ne changent pas en production : cache du bytecode Jinja sur
+# disque et pas de stat() des sources à chaque rendu
+JINJA_CACHE_DIR = ".jinja_cache"
+os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+app.config["TEMPLATES_AUTO_RELOAD"] = False
+app.jinja_env.auto_reload = False
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(JINJA_CACHE_DIR)
+
+def precompile_templates():
+    # Paye le coût de compilation au démarrage plutôt qu'à la première requête
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+# Compression des réponses texte (brotli si le client l'accepte, sinon gzip) ;
+# les PDF sont déjà compressés et restent hors liste
+app.config["COMPRESS_MIMETYPES"] = ["text/html", "application/json", "text/css"]
+app.config["COMPRESS_ALGORITHM"] = ["br", "gzip"]
+Compress(app)
+
+# Cache en mémoire pour les pages dont les stats ne changent qu'à la mutation
+cache = Cache(app, config={"CACHE_TYPE": "SimpleCache", "CACHE_DEFAULT_TIMEOUT": 30})
+
+def invalidate_dashboard_cache():
+    cache.delete("view//")  # clé générée par @cache.cached pour la route "/"
+
+# Limite les tentatives de connexion : le hachage de mot de passe est le
+# chemin le plus coûteux en CPU, on le protège contre le brute force
+limiter = Limiter(get_remote_address, app=app, storage_uri="memory://")
+
+# argon2id calibré pour rester < 50 ms par connexion légitime
+password_hasher = PasswordHasher(time_cost=2, memory_cost=64 * 1024, parallelism=1)
+
 # ===============================
 # DATABASE
 # ===============================
 DATABASE = "hotel.db"
 BACKUP_DIR = "backups"
+POOL_SIZE = os.cpu_count() or 4
+PAGE_SIZE = 50  # lignes par page sur les listes clients/chambres/réservations
+
+# Pool de connexions SQLite pré-ouvertes (ouvrir + parser le schéma à chaque
+# requête coûte cher ; on paye ce coût une seule fois par connexion)
+class ConnectionPool:
+    def __init__(self, database, size=POOL_SIZE):
+        self.database = database
+        self.size = size
+        self._pool = queue.Queue(maxsize=size)
+        self._lock = threading.Lock()
+        self._filled = False
+
+    def _new_connection(self):
+        conn = sqlite3.connect(self.database, check_same_thread=False,
+                               isolation_level=None, cached_statements=200)
+        conn.row_factory = sqlite3.Row
+        conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            PRAGMA busy_timeout=5000;
+            PRAGMA cache_size=-20000;
+            PRAGMA temp_store=memory;
+            PRAGMA foreign_keys=ON;
+        """)
+        return conn
+
+    def _fill(self):
+        with self._lock:
+            if not self._filled:
+                for _ in range(self.size):
+                    self._pool.put(self._new_connection())
+                self._filled = True
+
+    def get(self):
+        if not self._filled:
+            self._fill()
+        return self._pool.get()
+
+    def put(self, conn):
+        self._pool.put(conn)
+
+    def reset(self):
+        # Après un fork, les connexions héritées du parent ne doivent plus
+        # être utilisées (ni même fermées) ; on les abandonne et le pool se
+        # re-remplit à la première demande dans le processus enfant
+        with self._lock:
+            while True:
+                try:
+                    self._pool.get_nowait()
+                except queue.Empty:
+                    break
+            self._filled = False
+
+db_pool = ConnectionPool(DATABASE)
 
+# Usage hors requête HTTP (init, backup, scripts)
+@contextmanager
 def get_db_connection():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    conn = db_pool.get()
+    try:
+        yield conn
+    finally:
+        db_pool.put(conn)
+
+# Une seule connexion partagée pour toute la durée d'une requête HTTP
+def get_db():
+    if "db_conn" not in g:
+        g.db_conn = db_pool.get()
+    return g.db_conn
+
+@app.teardown_appcontext
+def release_db(exception=None):
+    conn = g.pop("db_conn", None)
+    if conn is not None:
+        db_pool.put(conn)  # retour au pool, jamais fermée
 
 # ===============================
 # INIT DATABASE
 # ===============================
 def init_db():
-    conn = get_db_connection()
+    with get_db_connection() as conn:
+        _create_schema(conn)
+
+    # Crée dossier backup si inexistant
+    if not os.path.exists(BACKUP_DIR):
+        os.makedirs(BACKUP_DIR)
+
+def _create_schema(conn):
     c = conn.cursor()
 
     # Table utilisateurs
@@ -73,32 +197,78 @@ def init_db():
         checkin TEXT,
         checkout TEXT,
         total REAL,
+        active INTEGER NOT NULL DEFAULT 1,
         FOREIGN KEY(client_id) REFERENCES clients(id),
         FOREIGN KEY(room_id) REFERENCES rooms(id)
     )
     """)
 
+    # Migration des anciennes bases : ajoute la colonne active et ne garde
+    # active que la réservation la plus récente de chaque chambre
+    try:
+        c.execute("ALTER TABLE bookings ADD COLUMN active INTEGER NOT NULL DEFAULT 1")
+    except sqlite3.OperationalError:
+        pass  # colonne déjà présente
+    else:
+        c.execute("""
+            UPDATE bookings SET active=0
+            WHERE id NOT IN (SELECT MAX(id) FROM bookings GROUP BY room_id)
+        """)
+
+    # L'unicité « une réservation active par chambre » est garantie par le
+    # B-tree lui-même : l'INSERT concurrent perd avec IntegrityError
+    c.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_active_booking
+        ON bookings(room_id) WHERE active=1
+    """)
+
+    # Index pour que le filtre par statut soit un parcours d'index
+    c.execute("CREATE INDEX IF NOT EXISTS idx_rooms_status ON rooms(status)")
+
+    # Index secondaires pour les jointures de la liste des réservations
+    c.execute("CREATE INDEX IF NOT EXISTS idx_bookings_client ON bookings(client_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_bookings_room ON bookings(room_id)")
+
     # Crée admin par défaut si inexistant
     admin = c.execute("SELECT * FROM users WHERE username='admin'").fetchone()
     if not admin:
-        hashed = generate_password_hash("admin123")
+        hashed = password_hasher.hash("admin123")
         c.execute("INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
                   ("admin", hashed, "admin"))
 
     conn.commit()
-    conn.close()
-
-    # Crée dossier backup si inexistant
-    if not os.path.exists(BACKUP_DIR):
-        os.makedirs(BACKUP_DIR)
 
 # ===============================
 # BACKUP AUTOMATIQUE
 # ===============================
+BACKUP_INTERVAL_HOURS = 6
+BACKUP_KEEP = 7
+
 def backup_db():
+    # Backup en ligne natif SQLite : cohérent avec le WAL, page par page,
+    # sans bloquer les écritures (contrairement à une copie du fichier)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     backup_file = os.path.join(BACKUP_DIR, f"hotel_backup_{timestamp}.db")
-    shutil.copy2(DATABASE, backup_file)
+    dst = sqlite3.connect(backup_file)
+    try:
+        with get_db_connection() as src:
+            src.backup(dst, pages=100, sleep=0.05)
+    finally:
+        dst.close()
+    _prune_backups()
+
+def _prune_backups(keep=BACKUP_KEEP):
+    backups = sorted(f for f in os.listdir(BACKUP_DIR)
+                     if f.startswith("hotel_backup_") and f.endswith(".db"))
+    for old in backups[:-keep]:
+        os.remove(os.path.join(BACKUP_DIR, old))
+
+def start_backup_thread(interval_hours=BACKUP_INTERVAL_HOURS):
+    def _loop():
+        while True:
+            backup_db()
+            time.sleep(interval_hours * 3600)
+    threading.Thread(target=_loop, daemon=True).start()
 
 # ===============================
 # LOGIN REQUIRED DECORATOR
@@ -114,16 +284,36 @@ def login_required(f):
 # ===============================
 # ROUTES UTILISATEURS
 # ===============================
+def verify_password(conn, user, password):
+    stored = user["password"]
+    if stored.startswith("$argon2"):
+        try:
+            password_hasher.verify(stored, password)
+        except VerifyMismatchError:
+            return False
+        if password_hasher.check_needs_rehash(stored):
+            conn.execute("UPDATE users SET password=? WHERE id=?",
+                         (password_hasher.hash(password), user["id"]))
+            conn.commit()
+        return True
+    # Ancien hash Werkzeug : vérifie puis migre vers argon2
+    if check_password_hash(stored, password):
+        conn.execute("UPDATE users SET password=? WHERE id=?",
+                     (password_hasher.hash(password), user["id"]))
+        conn.commit()
+        return True
+    return False
+
 @app.route("/login", methods=["GET", "POST"])
+@limiter.limit("10/minute")
 def login():
     error = None
     if request.method == "POST":
         username = request.form["username"]
         password = request.form["password"]
-        conn = get_db_connection()
+        conn = get_db()
         user = conn.execute("SELECT * FROM users WHERE username=?", (username,)).fetchone()
-        conn.close()
-        if user and check_password_hash(user["password"], password):
+        if user and verify_password(conn, user, password):
             session["user_id"] = user["id"]
             session["username"] = user["username"]
             session["role"] = user["role"]
@@ -141,15 +331,28 @@ def logout():
 # ===============================
 # DASHBOARD
 # ===============================
+@app.after_request
+def add_cache_headers(response):
+    # Laisse le navigateur réutiliser le dashboard quelques secondes
+    if request.endpoint == "dashboard":
+        response.headers["Cache-Control"] = "private, max-age=10"
+    return response
+
 @app.route("/")
 @login_required
+@cache.cached(timeout=30)
 def dashboard():
-    conn = get_db_connection()
-    total_rooms = conn.execute("SELECT COUNT(*) FROM rooms").fetchone()[0]
-    occupied_rooms = conn.execute("SELECT COUNT(*) FROM rooms WHERE status='Occupée'").fetchone()[0]
+    conn = get_db()
+    # Un seul aller-retour SQL au lieu de trois
+    row = conn.execute("""
+        SELECT (SELECT COUNT(*) FROM rooms) AS total,
+               (SELECT COUNT(*) FROM rooms WHERE status='Occupée') AS occ,
+               (SELECT COALESCE(SUM(total), 0) FROM bookings) AS rev
+    """).fetchone()
+    total_rooms = row["total"]
+    occupied_rooms = row["occ"]
     available_rooms = total_rooms - occupied_rooms
-    revenue = conn.execute("SELECT SUM(total) FROM bookings").fetchone()[0] or 0
-    conn.close()
+    revenue = row["rev"]
     return render_template("dashboard.html",
                            total_rooms=total_rooms,
                            occupied_rooms=occupied_rooms,
@@ -162,15 +365,35 @@ def dashboard():
 @app.route("/clients", methods=["GET", "POST"])
 @login_required
 def clients():
-    conn = get_db_connection()
+    conn = get_db()
     if request.method == "POST":
         name = request.form["name"]
         phone = request.form["phone"]
         conn.execute("INSERT INTO clients (name, phone) VALUES (?, ?)", (name, phone))
         conn.commit()
-    all_clients = conn.execute("SELECT * FROM clients").fetchall()
-    conn.close()
-    return render_template("clients.html", clients=all_clients)
+        invalidate_dashboard_cache()
+    page = max(request.args.get("page", 1, type=int) or 1, 1)
+    all_clients = conn.execute("SELECT id, name, phone FROM clients ORDER BY id LIMIT ? OFFSET ?",
+                               (PAGE_SIZE, (page - 1) * PAGE_SIZE)).fetchall()
+    return render_template("clients.html", clients=all_clients,
+                           page=page, has_next=len(all_clients) == PAGE_SIZE)
+
+@app.route("/clients/bulk", methods=["POST"])
+@login_required
+def clients_bulk():
+    # Import CSV (colonnes : nom, téléphone) — un seul commit pour tout
+    # le lot grâce à executemany dans une transaction explicite
+    file = request.files.get("file")
+    if file is None:
+        return "Fichier CSV manquant", 400
+    reader = csv.reader(io.TextIOWrapper(file.stream, encoding="utf-8"))
+    rows = ((row[0], row[1] if len(row) > 1 else "") for row in reader if row)
+    conn = get_db()
+    with conn:
+        conn.execute("BEGIN")
+        conn.executemany("INSERT INTO clients (name, phone) VALUES (?, ?)", rows)
+    invalidate_dashboard_cache()
+    return redirect(url_for("clients"))
 
 # ===============================
 # GESTION CHAMBRES
@@ -178,7 +401,7 @@ def clients():
 @app.route("/rooms", methods=["GET", "POST"])
 @login_required
 def rooms():
-    conn = get_db_connection()
+    conn = get_db()
     if request.method == "POST":
         number = request.form["number"]
         room_type = request.form["type"]
@@ -186,79 +409,176 @@ def rooms():
         conn.execute("INSERT INTO rooms (number, type, price) VALUES (?, ?, ?)",
                      (number, room_type, price))
         conn.commit()
-    all_rooms = conn.execute("SELECT * FROM rooms").fetchall()
-    conn.close()
-    return render_template("rooms.html", rooms=all_rooms)
+        invalidate_dashboard_cache()
+    page = max(request.args.get("page", 1, type=int) or 1, 1)
+    all_rooms = conn.execute("SELECT id, number, price, status FROM rooms ORDER BY id LIMIT ? OFFSET ?",
+                             (PAGE_SIZE, (page - 1) * PAGE_SIZE)).fetchall()
+    return render_template("rooms.html", rooms=all_rooms,
+                           page=page, has_next=len(all_rooms) == PAGE_SIZE)
+
+@app.route("/rooms/bulk", methods=["POST"])
+@login_required
+def rooms_bulk():
+    # Import CSV (colonnes : numéro, type, prix)
+    file = request.files.get("file")
+    if file is None:
+        return "Fichier CSV manquant", 400
+    reader = csv.reader(io.TextIOWrapper(file.stream, encoding="utf-8"))
+    rows = ((row[0], row[1], row[2]) for row in reader if len(row) >= 3)
+    conn = get_db()
+    with conn:
+        conn.execute("BEGIN")
+        conn.executemany("INSERT INTO rooms (number, type, price) VALUES (?, ?, ?)", rows)
+    invalidate_dashboard_cache()
+    return redirect(url_for("rooms"))
 
 # ===============================
 # GESTION RÉSERVATIONS
 # ===============================
+DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+BOOKINGS_LIST_SQL = """
+    SELECT b.id, c.name as client_name, r.number as room_number, b.checkin, b.checkout, b.total
+    FROM bookings b
+    JOIN clients c ON b.client_id = c.id
+    JOIN rooms r ON b.room_id = r.id
+"""
+
 @app.route("/bookings", methods=["GET", "POST"])
 @login_required
 def bookings():
-    conn = get_db_connection()
-    clients = conn.execute("SELECT * FROM clients").fetchall()
-    rooms = conn.execute("SELECT * FROM rooms WHERE status='Disponible'").fetchall()
+    conn = get_db()
+    clients = conn.execute("SELECT id, name FROM clients").fetchall()
+    rooms = conn.execute("SELECT id, number FROM rooms WHERE status='Disponible'").fetchall()
     if request.method == "POST":
         client_id = request.form["client_id"]
         room_id = request.form["room_id"]
         checkin = request.form["checkin"]
         checkout = request.form["checkout"]
-        price = conn.execute("SELECT price FROM rooms WHERE id=?", (room_id,)).fetchone()[0]
-        total_days = (datetime.strptime(checkout, "%Y-%m-%d") - datetime.strptime(checkin, "%Y-%m-%d")).days
-        total = price * total_days
-        conn.execute("INSERT INTO bookings (client_id, room_id, checkin, checkout, total) VALUES (?, ?, ?, ?, ?)",
-                     (client_id, room_id, checkin, checkout, total))
-        conn.execute("UPDATE rooms SET status='Occupée' WHERE id=?", (room_id,))
-        conn.commit()
-    all_bookings = conn.execute("""
-        SELECT b.id, c.name as client_name, r.number as room_number, b.checkin, b.checkout, b.total
-        FROM bookings b
-        JOIN clients c ON b.client_id = c.id
-        JOIN rooms r ON b.room_id = r.id
-    """).fetchall()
-    conn.close()
-    return render_template("bookings.html", bookings=all_bookings, clients=clients, rooms=rooms)
+        if not (DATE_RE.match(checkin) and DATE_RE.match(checkout)):
+            return "Dates invalides", 400
+        try:
+            # fromisoformat : chemin C bien plus rapide que strptime
+            total_days = (date.fromisoformat(checkout) - date.fromisoformat(checkin)).days
+        except ValueError:
+            return "Dates invalides", 400
+        # Une seule transaction IMMEDIATE : un seul fsync, et le verrou
+        # d'écriture empêche deux requêtes de réserver la même chambre
+        delay = 0.2
+        for attempt in range(5):
+            try:
+                with conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    # Prix lu et total calculé dans l'INSERT lui-même ;
+                    # rowcount == 0 si la chambre n'est plus disponible
+                    cur = conn.execute(
+                        "INSERT INTO bookings (client_id, room_id, checkin, checkout, total) "
+                        "SELECT ?, ?, ?, ?, price * ? FROM rooms WHERE id=? AND status='Disponible'",
+                        (client_id, room_id, checkin, checkout, total_days, room_id))
+                    if cur.rowcount == 0:
+                        return "Chambre déjà réservée ou introuvable", 409
+                    conn.execute("UPDATE rooms SET status='Occupée' WHERE id=?", (room_id,))
+                break
+            except sqlite3.IntegrityError:
+                # ux_active_booking : une autre requête a réservé la chambre
+                return "Chambre déjà réservée ou introuvable", 409
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) or attempt == 4:
+                    raise
+                time.sleep(delay)
+                delay *= 2
+        invalidate_dashboard_cache()
+    page = max(request.args.get("page", 1, type=int) or 1, 1)
+    # Curseur passé tel quel à Jinja : les lignes sont streamées pendant le
+    # rendu au lieu d'être toutes matérialisées en Python
+    all_bookings = conn.execute(BOOKINGS_LIST_SQL + " ORDER BY b.id LIMIT ? OFFSET ?",
+                                (PAGE_SIZE, (page - 1) * PAGE_SIZE))
+    has_next = conn.execute("SELECT EXISTS(SELECT 1 FROM bookings LIMIT 1 OFFSET ?)",
+                            (page * PAGE_SIZE,)).fetchone()[0]
+    return render_template("bookings.html", bookings=all_bookings, clients=clients, rooms=rooms,
+                           page=page, has_next=bool(has_next))
 
 # ===============================
 # GÉNÉRATION PDF FACTURE
 # ===============================
+INVOICE_SQL = """
+    SELECT b.id, c.name as client_name, c.phone, r.number as room_number, r.type, b.checkin, b.checkout, b.total
+    FROM bookings b
+    JOIN clients c ON b.client_id = c.id
+    JOIN rooms r ON b.room_id = r.id
+"""
+
+# Feuille de styles construite une fois : getSampleStyleSheet() reconstruit
+# tout le registre ReportLab à chaque appel
+_STYLES = getSampleStyleSheet()
+_TITLE = _STYLES["Title"]
+
+def _invoice_elements(booking):
+    # Un Table mis en page en une passe, au lieu de 5 Paragraph séparés
+    details = Table([
+        ["Client", f"{booking['client_name']} - {booking['phone']}"],
+        ["Chambre", f"{booking['room_number']} - {booking['type']}"],
+        ["Check-in", booking["checkin"]],
+        ["Check-out", booking["checkout"]],
+        ["Total", f"{booking['total']} €"],
+    ], hAlign="LEFT")
+    return [
+        Paragraph("FACTURE HÔTEL", _TITLE),
+        Spacer(1, 12),
+        details,
+    ]
+
+# Une réservation est immuable après création : le PDF se mémoïse sans risque
+@cache.memoize()
+def _render_invoice_bytes(booking_id):
+    booking = get_db().execute(INVOICE_SQL + " WHERE b.id=?", (booking_id,)).fetchone()
+    if not booking:
+        return None
+    buf = io.BytesIO()
+    SimpleDocTemplate(buf, pageCompression=1).build(_invoice_elements(booking))
+    return buf.getvalue()
+
 @app.route("/invoice/<int:booking_id>")
 @login_required
 def invoice(booking_id):
-    conn = get_db_connection()
-    booking = conn.execute("""
-        SELECT b.id, c.name as client_name, c.phone, r.number as room_number, r.type, b.checkin, b.checkout, b.total
-        FROM bookings b
-        JOIN clients c ON b.client_id = c.id
-        JOIN rooms r ON b.room_id = r.id
-        WHERE b.id=?
-    """, (booking_id,)).fetchone()
-    conn.close()
+    pdf = _render_invoice_bytes(booking_id)
+    if pdf is None:
+        return "Réservation introuvable"
+    # La facture est immuable : ETag fort + 304 si le client l'a déjà
+    response = send_file(io.BytesIO(pdf), mimetype="application/pdf", as_attachment=True,
+                         download_name=f"invoice_{booking_id}.pdf", conditional=True)
+    response.set_etag(hashlib.md5(pdf).hexdigest())
+    return response.make_conditional(request)
 
-    if not booking:
+@app.route("/invoices/batch")
+@login_required
+def invoices_batch():
+    # /invoices/batch?ids=1,2,3 : un seul doc.build() pour N factures
+    ids = [int(i) for i in request.args.get("ids", "").split(",") if i.strip().isdigit()]
+    if not ids:
+        return "Aucune réservation sélectionnée", 400
+    placeholders = ",".join("?" * len(ids))
+    rows = get_db().execute(INVOICE_SQL + f" WHERE b.id IN ({placeholders})", ids).fetchall()
+    if not rows:
         return "Réservation introuvable"
 
-    filename = f"invoice_{booking_id}.pdf"
-    doc = SimpleDocTemplate(filename)
-    styles = getSampleStyleSheet()
     elements = []
+    for i, booking in enumerate(rows):
+        if i:
+            elements.append(PageBreak())
+        elements.extend(_invoice_elements(booking))
 
-    elements.append(Paragraph("FACTURE HÔTEL", styles["Title"]))
-    elements.append(Spacer(1, 12))
-    elements.append(Paragraph(f"Client: {booking['client_name']} - {booking['phone']}", styles["Normal"]))
-    elements.append(Paragraph(f"Chambre: {booking['room_number']} - {booking['type']}", styles["Normal"]))
-    elements.append(Paragraph(f"Check-in: {booking['checkin']}", styles["Normal"]))
-    elements.append(Paragraph(f"Check-out: {booking['checkout']}", styles["Normal"]))
-    elements.append(Paragraph(f"Total: {booking['total']} €", styles["Normal"]))
-
-    doc.build(elements)
-    return send_file(filename, as_attachment=True)
+    buf = io.BytesIO()
+    SimpleDocTemplate(buf, pageCompression=1).build(elements)
+    buf.seek(0)
+    return send_file(buf, mimetype="application/pdf", as_attachment=True,
+                     download_name="invoices.pdf", conditional=True)
 
 # ===============================
 # LANCER L'APPLICATION
 # ===============================
 if __name__ == "__main__":
     init_db()
-    backup_db()  # Backup automatique au lancement
+    precompile_templates()
+    start_backup_thread()  # Backup automatique en arrière-plan
     app.run(debug=False)
\ No newline at end of file
@@ -0,0 +1,19 @@
+# Configuration gunicorn : N workers x M threads pour que le pool de
+# connexions et le WAL puissent réellement paralléliser les lectures
+workers = 4
+worker_class = "gthread"
+threads = 8
+preload_app = True
+
+def on_starting(server):
+    # Dans le master, avant le fork : schéma, templates, backup périodique
+    from app import init_db, precompile_templates, start_backup_thread
+    init_db()
+    precompile_templates()
+    start_backup_thread()
+
+def post_fork(server, worker):
+    # Les connexions SQLite ne survivent pas au fork : chaque worker
+    # rouvre les siennes
+    import app
+    app.db_pool.reset()